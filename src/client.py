@@ -1,106 +1,175 @@
 from abc import ABC, abstractmethod
 import csv
 from functools import wraps
+from itertools import islice
+import threading
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 from requests.models import Response
-from requests import Session, get
+from requests import Session
 from requests.adapters import HTTPAdapter
 from urllib3.util import Retry
 from requests.exceptions import RequestException, HTTPError
 
 from exceptions import UserException
-from endpoint_mapping import ENDPOINT_MAPPING
-from typing import Literal, Union
+from endpoint_mapping import ENDPOINT_MAPPING, KEY_USE_TABLE_AS_TYPE, OBJECT_TYPE_IDS
+from typing import Iterable, Literal, Optional, Union
 
 import logging
+import orjson
 
-BATCH_SIZE = 100
+CONTACT_LIST_BATCH_SIZE = 500  # contacts/v1 list endpoints accept up to 500 contacts per request
 LOGGING_INTERVAL = 200
 SLEEP_INTERVAL = 0.1  # https://developers.hubspot.com/docs/api/usage-details#rate-limits
+RATE_LIMIT_REMAINING_HEADER = 'X-HubSpot-RateLimit-Remaining'
+RATE_LIMIT_INTERVAL_HEADER = 'X-HubSpot-RateLimit-Interval-Milliseconds'
 ERRORS_TABLE_COLUMNS = ['status', 'category', 'message', 'context']
+KEY_MAX_WORKERS = 'max_workers'
+DEFAULT_MAX_WORKERS = 1
 
 
-def batched(batch_size=BATCH_SIZE, logging_interval=LOGGING_INTERVAL, sleep_interval=SLEEP_INTERVAL):
+def chunked(iterable, size):
+    """Yields lists of at most `size` items from `iterable` without materializing it as a whole."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def batched(batch_size=None, logging_interval=LOGGING_INTERVAL):
     def wrapper(func):
         @wraps(func)
         def inner(self, data_reader, *args, **kwargs):
-            data_batch = []
-            for i, record in enumerate(data_reader, start=1):
-                data_batch.append(record)
-                if not i % batch_size:
-                    func(self, data_batch, *args, **kwargs)
-                    data_batch = []
-                if not i % logging_interval:
-                    logging.info(f'Processed {i} rows.')
-            if data_batch:
+            processed = 0
+            # the batch size of the endpoint is used unless one is given explicitly
+            for data_batch in chunked(data_reader, batch_size or self.batch_size):
                 func(self, data_batch, *args, **kwargs)
+                previously_processed, processed = processed, processed + len(data_batch)
+                if processed // logging_interval > previously_processed // logging_interval:
+                    logging.info('Processed %s rows.', processed)
 
         return inner
 
     return wrapper
 
 
-def get_rows_by_list_id(data_reader):
-    rows_by_list_id = defaultdict(list)
+def get_vids_by_list_id(data_reader):
+    """Collects values of the [vids] column per list in a single pass, without keeping the whole rows"""
+    vids_by_list_id = defaultdict(list)
     for row in data_reader:
-        if not row['list_id']:
-            raise UserException('Column [list_id] cannot be empty.')
-        rows_by_list_id[row['list_id']].append(row)
-    return rows_by_list_id
+        vids_by_list_id[row['list_id']].append(row['vids'])
+    return vids_by_list_id
 
 
-def get_vids_from_rows(rows):
-    vids = []
-    for row in rows:
-        if not row['vids']:
-            raise UserException(f"Cannot process list with empty records in [vids] column. {row}")
-        vids.append(row['vids'])
-    return vids
+def create_session() -> Session:
+    """
+    Creates a Session with the retry policy used for all calls to Hubspot API.
+    Sharing one session keeps a single pool of keep-alive connections for the whole run.
+    """
+    session = Session()
+    session.mount('https://',
+                  HTTPAdapter(
+                      max_retries=Retry(
+                          total=8,
+                          backoff_factor=0.5,  # {backoff factor} * (2 ** ({number of total retries} - 1))
+                          status_forcelist=[429, 500, 502, 503, 504, 521, 524],
+                          allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE', 'PATCH']),
+                          # HubSpot sends Retry-After with 429 responses once the rate limit is hit
+                          respect_retry_after_header=True,
+                          # the last response is returned once retries run out, so it ends up in the errors table
+                          raise_on_status=False)))
+    return session
+
+
+class RateLimiter:
+    """Spaces out the start of requests, shared by all worker threads of a client"""
+
+    def __init__(self, interval: Union[int, float] = SLEEP_INTERVAL):
+        self.min_interval = interval
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_request_at = 0.0
+
+    def wait(self) -> None:
+        """Blocks until the calling thread is allowed to send its request"""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def update(self, headers) -> None:
+        """
+        Spreads the requests HubSpot reports as remaining evenly over its rate limit window,
+        never sending them faster than the initial interval.
+        """
+        try:
+            remaining = int(headers[RATE_LIMIT_REMAINING_HEADER])
+            window = int(headers[RATE_LIMIT_INTERVAL_HEADER]) / 1000
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self.interval = max(self.min_interval, window / max(remaining, 1))
 
 
 class HubSpotClient(ABC):
     """Template for classes handling communication with Hubspot API"""
 
-    def __init__(self, endpoint: str, config_params: dict, error_writer: csv.DictWriter, table_name: str):
+    def __init__(self, endpoint: str, config_params: dict, error_writer: csv.DictWriter, table_name: str,
+                 session: Optional[Session] = None):
         # Base parameters for the requests
         self.base_url = 'https://api.hubapi.com/'
         self.endpoint = endpoint
-        self.base_params = {}
+        # Complete url (a template for endpoints with path parameters) and method are the same for every row
+        self.url = f'{self.base_url}{ENDPOINT_MAPPING[endpoint]["endpoint"]}'
+        self.method = ENDPOINT_MAPPING[endpoint]["method"]
+        self.batch_size = ENDPOINT_MAPPING[endpoint]["batch_size"]
         self.config_params = config_params
-        self.base_headers = {'Authorization': f'Bearer {self.config_params.get("#private_app_token")}'}
+        self.base_headers = {'Authorization': f'Bearer {self.config_params.get("#private_app_token")}',
+                             'Content-Type': 'application/json'}
         self.error_writer = error_writer
         self.table_name = table_name
 
-        self.s = Session()
-        self.s.mount('https://',
-                     HTTPAdapter(
-                         max_retries=Retry(
-                             total=5,
-                             backoff_factor=0.3,  # {backoff factor} * (2 ** ({number of total retries} - 1))
-                             status_forcelist=[429, 500, 502, 503, 504, 521, 524],
-                             allowed_methods=frozenset(['POST', 'PUT', 'DELETE', 'PATCH']))))
+        self.s = session or create_session()
+        self.s.headers.update(self.base_headers)
+
+        # Requests are sent from a pool of worker threads when parallel requests are enabled
+        self.max_workers = int(self.config_params.get(KEY_MAX_WORKERS, DEFAULT_MAX_WORKERS))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+        self.pending_requests = deque()
+        self.rate_limiter = RateLimiter()
+        self.errors_lock = threading.Lock()
+        # Requests are counted instead of logged one by one, see log_summary
+        self.requests_sent = 0
+        self.requests_failed = 0
 
     @abstractmethod
     def process_requests(self, data_reader) -> None:
         """
         Handles the assembly of URLs to call and request bodies to send.
         Args:
-            data_reader: csv.DictReader with loaded csv
+            data_reader: rows of the input csv as dicts
         Returns:
             None
         """
 
     def log_batch_errors(self, response):
-        self.error_writer.errors = True
-        for error in response.json()['errors']:
-            self.error_writer.writerow(error)
+        errors = orjson.loads(response.content)['errors']
+        with self.errors_lock:
+            self.error_writer.errors = True
+            self.requests_failed += 1
+            for error in errors:
+                # batch errors carry more fields than the errors table has, e.g. subCategory
+                self.error_writer.writerow({field: error.get(field) for field in ERRORS_TABLE_COLUMNS})
 
     def log_errors(self, response):
-        self.error_writer.errors = True
         try:
-            error = response.json()
+            error = orjson.loads(response.content)
             error_row = {
                 field: error.get(field)
                 for field in ERRORS_TABLE_COLUMNS
@@ -111,51 +180,86 @@ class HubSpotClient(ABC):
                 'category': 'unknown',
                 'message': f" Response: {response.text}  Exception: {str(e)}",
             }
-        self.error_writer.writerow(error_row)
+        with self.errors_lock:
+            self.error_writer.errors = True
+            self.requests_failed += 1
+            self.error_writer.writerow(error_row)
 
-    def make_request(self, url: str, request_body: Union[dict, None],
-                     method: Literal["post", "put", "delete"],
-                     sleep_interval: Union[int, float] = SLEEP_INTERVAL) -> Response:
+    def send_request(self, url: str, request_body: Union[dict, None],
+                     method: Literal["post", "put", "delete", "patch"]) -> Response:
         """
-        Makes Post/Put/Delete calls to target url.
+        Sends a single request, waiting for the rate limiter, and logs any errors into the errors table.
         Args:
             url: complete target url
             request_body: dict that will be sent in POST
-            method: post/put/delete defined in endpoint_mapping.py
-            sleep_interval: interval to sleep in seconds between requests
+            method: post/put/delete/patch defined in endpoint_mapping.py
 
         Returns:
             response
         """
-
-        if method not in ["post", "put", "delete", "patch"]:
-            raise UserException(f"Method {method} not allowed.")
-
-        response = self.s.request(method, url, headers=self.base_headers,
-                                  params=self.base_params, json=request_body)
+        self.rate_limiter.wait()
+        data = orjson.dumps(request_body) if request_body is not None else None
+        response = self.s.request(method, url, data=data)
+        self.rate_limiter.update(response.headers)
         try:
             response.raise_for_status()
         except RequestException:
             self.log_errors(response)
 
-        time.sleep(sleep_interval)
+        if response.status_code == 207:
+            logging.error("%s request to %s partially failed with status code 207", method, url)
+            self.log_batch_errors(response)
         return response
 
-    def make_batch_request(self, inputs: list):
+    def make_request(self, url: str, request_body: Union[dict, None],
+                     method: Literal["post", "put", "delete", "patch"]) -> None:
+        """
+        Makes Post/Put/Delete calls to target url. When parallel requests are enabled, the call is handed over
+        to the worker pool and at most twice the number of workers requests are kept in flight.
+        Args:
+            url: complete target url
+            request_body: dict that will be sent in POST
+            method: post/put/delete/patch defined in endpoint_mapping.py
+
+        Returns:
+            None
+        """
+
+        if method not in ["post", "put", "delete", "patch"]:
+            raise UserException(f"Method {method} not allowed.")
+
+        self.requests_sent += 1
+        if not self.executor:
+            self.send_request(url, request_body, method)
+            return
+
+        if len(self.pending_requests) >= 2 * self.max_workers:
+            self.pending_requests.popleft().result()
+        self.pending_requests.append(self.executor.submit(self.send_request, url, request_body, method))
+
+    def make_batch_request(self, inputs: list, url: Optional[str] = None):
         """
         Makes a batch request with the HubSpot specified data body.
         Args:
             inputs: list of individual HubsSpot objects to be created/updated
+            url: complete target url, for endpoints with path parameters
         Returns:
             None
         """
-        url = f'{self.base_url}{ENDPOINT_MAPPING[self.endpoint]["endpoint"]}'
-        method = ENDPOINT_MAPPING[self.endpoint]["method"]
-        response = self.make_request(url=url, request_body={'inputs': inputs}, method=method)
+        self.make_request(url=url or self.url, request_body={'inputs': inputs}, method=self.method)
 
-        if response.status_code == 207:
-            logging.error(f"{method} request to {url} partially failed with status code 207")
-            self.log_batch_errors(response)
+    def wait_for_requests(self) -> None:
+        """Waits until all requests handed over to the worker pool are finished, re-raising their errors"""
+        while self.pending_requests:
+            self.pending_requests.popleft().result()
+
+    def log_summary(self) -> None:
+        logging.info('Sent %s requests to Hubspot API, %s of them failed or partially failed.',
+                     self.requests_sent, self.requests_failed)
+
+    def close(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=True)
 
 
 class CreateContact(HubSpotClient):
@@ -163,7 +267,7 @@ class CreateContact(HubSpotClient):
 
     @batched()
     def process_requests(self, data_reader):
-        inputs = [{"properties": {k: str(v) for k, v in row.items()}} for row in data_reader]
+        inputs = [{"properties": row} for row in data_reader]
         self.make_batch_request(inputs)
 
 
@@ -173,24 +277,27 @@ class CreateContactList(HubSpotClient):
     def process_requests(self, data_reader):
         for row in data_reader:
             request_body = {
-                'name': str(row['name'])
+                'name': row['name']
             }
             self.make_request(
-                url=f'{self.base_url}{ENDPOINT_MAPPING[self.endpoint]["endpoint"]}',
+                url=self.url,
                 request_body=request_body,
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
+                method=self.method)
 
 
-class AddSecondaryEmail(HubSpotClient):
-    """Adds a secondary email to a contact"""
+class SecondaryEmailObject(HubSpotClient):
+    """Parent class for adding/removing a secondary email of a contact, both addressed by the url only"""
 
     def process_requests(self, data_reader):
         for row in data_reader:
             self.make_request(
-                url=f'{self.base_url}{ENDPOINT_MAPPING[self.endpoint]["endpoint"]}'
-                    f'{row["vid"]}/email/{row["secondary_email"]}',
+                url=f'{self.url}{row["vid"]}/email/{row["secondary_email"]}',
                 request_body=None,
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
+                method=self.method)
+
+
+class AddSecondaryEmail(SecondaryEmailObject):
+    """Adds a secondary email to a contact"""
 
 
 class UpdateSecondaryEmail(HubSpotClient):
@@ -203,144 +310,109 @@ class UpdateSecondaryEmail(HubSpotClient):
                 "updatedSecondaryEmail": row["secondary_email"]
             }
             self.make_request(
-                url=f'{self.base_url}{ENDPOINT_MAPPING[self.endpoint]["endpoint"]}{row["vid"]}',
+                url=f'{self.url}{row["vid"]}',
                 request_body=request_body,
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
+                method=self.method)
 
 
-class RemoveSecondaryEmail(HubSpotClient):
+class RemoveSecondaryEmail(SecondaryEmailObject):
     """Removes a secondary email from a contact"""
 
-    def process_requests(self, data_reader):
-        for row in data_reader:
-            self.make_request(
-                url=f'{self.base_url}{ENDPOINT_MAPPING[self.endpoint]["endpoint"]}'
-                    f'{row["vid"]}/email/{row["secondary_email"]}',
-                request_body=None,
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
-
 
 class CreateCustomList(HubSpotClient):
     """Creates list for custom objects specified in the input table via object_type column"""
 
     def process_requests(self, data_reader):
-        object_types_to_id = {
-            'contact': '0-1',
-            'company': '0-2',
-            'deal': '0-3'
-        }
         for row in data_reader:
             request_body = {
-                'name': str(row['name']),
+                'name': row['name'],
                 'processingType': 'MANUAL',
-                'objectTypeId': object_types_to_id[row['object_type']]
+                'objectTypeId': OBJECT_TYPE_IDS[row['object_type']]
             }
-            self.make_request(
-                url=f'{self.base_url}{ENDPOINT_MAPPING[self.endpoint]["endpoint"]}',
-                request_body=request_body,
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
+            self.make_request(url=self.url, request_body=request_body, method=self.method)
 
 
 class AddContactToList(HubSpotClient):
     """Adds contacts to list"""
 
     def process_requests(self, data_reader):
-        rows_by_list_id = get_rows_by_list_id(data_reader)
-
-        for list_id, rows in rows_by_list_id.items():
-            vids = []
-            emails = []
-            for row in rows:
-                if row["vids"]:
-                    vids.append(row["vids"])
-                else:
-                    emails.append(row["emails"])
-
-            endpoint_path = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(list_id=list_id)
-            self.make_request(
-                url=f'{self.base_url}{endpoint_path}',
-                request_body={"vids": vids, "emails": emails},
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
+        # vids and emails of each list are collected in a single pass, vids take precedence over emails
+        contacts_by_list_id = defaultdict(lambda: ([], []))
+        for row in data_reader:
+            vids, emails = contacts_by_list_id[row["list_id"]]
+            vid = row["vids"]
+            if vid:
+                vids.append(vid)
+            else:
+                emails.append(row["emails"])
+
+        for list_id, (vids, emails) in contacts_by_list_id.items():
+            # vids go first, emails fill up the rest of the request
+            url = self.url.format(list_id=list_id)
+            for start in range(0, len(vids) + len(emails), CONTACT_LIST_BATCH_SIZE):
+                end = start + CONTACT_LIST_BATCH_SIZE
+                request_body = {
+                    "vids": vids[start:end],
+                    "emails": emails[max(start - len(vids), 0):max(end - len(vids), 0)]
+                }
+                self.make_request(url=url, request_body=request_body, method=self.method)
 
 
 class RemoveContactFromList(HubSpotClient):
     """Removes contacts from lists"""
 
     def process_requests(self, data_reader):
-        rows_by_list_id = get_rows_by_list_id(data_reader)
+        vids_by_list_id = get_vids_by_list_id(data_reader)
 
-        for list_id, rows in rows_by_list_id.items():
-            vids = get_vids_from_rows(rows)
+        for list_id, vids in vids_by_list_id.items():
+            url = self.url.format(list_id=list_id)
+            for vids_batch in chunked(vids, CONTACT_LIST_BATCH_SIZE):
+                self.make_request(url=url, request_body={'vids': vids_batch}, method=self.method)
 
-            endpoint_path = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(list_id=list_id)
-            self.make_request(
-                url=f'{self.base_url}{endpoint_path}',
-                request_body={'vids': vids},
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
 
-
-class UpdateContact(HubSpotClient):
-    """Updates contacts"""
+class UpdateContactByEmail(HubSpotClient):
+    """Updates contacts in batches using email as ID"""
 
     @batched()
     def process_requests(self, data_reader):
-        inputs = []
-        for row in data_reader:
-            if not row["vid"]:
-                raise UserException(f"Cannot process list with empty records in [vid] column. {row}")
-
-            inputs.append({
-                "id": row.pop('vid'),
-                "properties": {k: str(v) for k, v in row.items()}
-            })
+        inputs = [{"id": row.pop('email'), "idProperty": "email", "properties": row} for row in data_reader]
         self.make_batch_request(inputs)
 
 
-class UpdateContactByEmail(HubSpotClient):
-    """Updates contacts using email as ID"""
-
-    def process_requests(self, data_reader):
-        for row in data_reader:
-            if not row["email"]:
-                raise UserException(f"Cannot process list with empty records in [email] column. {row}")
-
-            email = row.pop('email')
-            request_body = {'properties': [{'property': k, 'value': str(v)} for k, v in row.items()]}
-            endpoint_path = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(email=email)
-            self.make_request(
-                url=f'{self.base_url}{endpoint_path}',
-                request_body=request_body,
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
-
-
 class CreateCompany(HubSpotClient):
     """Creates company"""
 
     @batched()
     def process_requests(self, data_reader):
-        inputs = []
-        for row in data_reader:
-            if not row["name"]:
-                raise UserException(f"Cannot process company with empty records in [name] column. {row}")
-            properties = {k: str(v) for k, v in row.items()}
-            inputs.append({"properties": properties})
+        inputs = [{"properties": row} for row in data_reader]
         self.make_batch_request(inputs)
 
 
-class AddObjectToList(HubSpotClient):
-    """Parent class for adding Objects to list using List ID and Object ID"""
+class ObjectListMembership(HubSpotClient, ABC):
+    """Parent class for changing list memberships of Objects using List ID and Object ID"""
 
-    def process_requests(self, data_reader) -> None:
-        rows_by_list_id = get_rows_by_list_id(data_reader)
+    @property
+    @abstractmethod
+    def records_key(self) -> str:
+        """Key of the add-and-remove request body holding the Object IDs"""
 
-        for list_id, rows in rows_by_list_id.items():
-            vids = get_vids_from_rows(rows)
+    def process_requests(self, data_reader) -> None:
+        vids_by_list_id = get_vids_by_list_id(data_reader)
 
-            endpoint_path = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(list_id=list_id)
+        for list_id, vids in vids_by_list_id.items():
+            url = self.url.format(list_id=list_id)
             self.make_request(
-                url=f'{self.base_url}{endpoint_path}',
-                request_body={'recordIdsToAdd': vids},
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
+                url=url,
+                request_body={self.records_key: vids},
+                method=self.method)
+
+
+class AddObjectToList(ObjectListMembership):
+    """Parent class for adding Objects to list using List ID and Object ID"""
+
+    @property
+    def records_key(self) -> str:
+        return 'recordIdsToAdd'
 
 
 class AddCompanyToList(AddObjectToList):
@@ -351,20 +423,12 @@ class AddDealToList(AddObjectToList):
     """Adds deals to list"""
 
 
-class RemoveObjectFromList(HubSpotClient):
+class RemoveObjectFromList(ObjectListMembership):
     """Parent class for removing Objects from list using List ID and Object ID"""
 
-    def process_requests(self, data_reader):
-        rows_by_list_id = get_rows_by_list_id(data_reader)
-
-        for list_id, rows in rows_by_list_id.items():
-            vids = get_vids_from_rows(rows)
-
-            endpoint_path = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(list_id=list_id)
-            self.make_request(
-                url=f'{self.base_url}{endpoint_path}',
-                request_body={'recordIdsToRemove': vids},
-                method=ENDPOINT_MAPPING[self.endpoint]["method"])
+    @property
+    def records_key(self) -> str:
+        return 'recordIdsToRemove'
 
 
 class RemoveCompanyFromList(RemoveObjectFromList):
@@ -375,35 +439,13 @@ class RemoveDealFromList(RemoveObjectFromList):
     """Removes deals from list"""
 
 
-class UpdateCompany(HubSpotClient):
-    """Updates company using company ID"""
-
-    @batched()
-    def process_requests(self, data_reader):
-        inputs = []
-        for row in data_reader:
-            if not row["company_id"]:
-                raise UserException(f"Cannot process list with empty records in [company_id] column. {row}")
-
-            inputs.append({
-                "id": row.pop("company_id"),
-                "properties": {k: str(v) for k, v in row.items()}
-            })
-        self.make_batch_request(inputs)
-
-
 class CreateDeal(HubSpotClient):
     """Creates deals"""
 
     @batched()
     def process_requests(self, data_reader):
         # /crm/v3/objects/deals/batch/create
-        inputs = []
-        for row in data_reader:
-            if not row["hubspot_owner_id"]:
-                raise UserException(f"Cannot process deal with empty record in [hubspot_owner_id] column. {row}")
-
-            inputs.append({"properties": row})
+        inputs = [{"properties": row} for row in data_reader]
         self.make_batch_request(inputs)
 
 
@@ -414,10 +456,8 @@ class CreateAssociatedObject(HubSpotClient):
     def process_requests(self, data_reader):
         inputs = []
         for row in data_reader:
-            if not row["association_id"]:
-                raise UserException(f"Cannot process object with empty record in [association_id] column. {row}")
             associations = [{
-                'to': {'id': str(row.pop('association_id'))},
+                'to': {'id': row.pop('association_id')},
                 'types': [{
                     'associationCategory': row.pop('association_category'),
                     'associationTypeId': row.pop('association_type_id')
@@ -476,29 +516,50 @@ class CreateTask(CreateAssociatedObject):
 
 
 class UpdateObject(HubSpotClient, ABC):
-    """Parent class to CRM objects - updates objects"""
+    """Parent class to CRM objects - updates objects by the id in the id column"""
 
     @property
     @abstractmethod
-    def object_type(self) -> str:
+    def id_column(self) -> str:
         pass
 
     @batched()
     def process_requests(self, data_reader):
-        inputs = []
-        for row in data_reader:
-            if not row[f"{self.object_type}_id"]:
-                raise UserException(f"Cannot process {self.object_type} with empty records "
-                                    f"in [{self.object_type}_id] column. {row}")
-
-            inputs.append({
-                "id": str(row.pop(f'{self.object_type}_id')),
-                "properties": row
-            })
+        id_column = self.id_column
+        inputs = [{"id": row.pop(id_column), "properties": row} for row in data_reader]
         self.make_batch_request(inputs)
 
 
-class UpdateDeal(UpdateObject):
+class UpdateContact(UpdateObject):
+    """Updates Contact using vid"""
+
+    @property
+    def id_column(self) -> str:
+        return 'vid'
+
+
+class UpdateCrmObject(UpdateObject, ABC):
+    """Parent class to CRM objects identified by the [object_type]_id column"""
+
+    @property
+    @abstractmethod
+    def object_type(self) -> str:
+        pass
+
+    @property
+    def id_column(self) -> str:
+        return f'{self.object_type}_id'
+
+
+class UpdateCompany(UpdateCrmObject):
+    """Updates Company using company_id"""
+
+    @property
+    def object_type(self) -> str:
+        return 'company'
+
+
+class UpdateDeal(UpdateCrmObject):
     """Updates Deal using deal_id"""
 
     @property
@@ -506,7 +567,7 @@ class UpdateDeal(UpdateObject):
         return 'deal'
 
 
-class UpdateTicket(UpdateObject):
+class UpdateTicket(UpdateCrmObject):
     """Updates Ticket using ticket_id"""
 
     @property
@@ -514,7 +575,7 @@ class UpdateTicket(UpdateObject):
         return 'ticket'
 
 
-class UpdateProduct(UpdateObject):
+class UpdateProduct(UpdateCrmObject):
     """Updates Product using product_id"""
 
     @property
@@ -522,7 +583,7 @@ class UpdateProduct(UpdateObject):
         return 'product'
 
 
-class UpdateQuote(UpdateObject):
+class UpdateQuote(UpdateCrmObject):
     """Updates Quote using quote_id"""
 
     @property
@@ -530,7 +591,7 @@ class UpdateQuote(UpdateObject):
         return 'quote'
 
 
-class UpdateLineItem(UpdateObject):
+class UpdateLineItem(UpdateCrmObject):
     """Updates Line item using line_item_id"""
 
     @property
@@ -538,7 +599,7 @@ class UpdateLineItem(UpdateObject):
         return 'line_item'
 
 
-class UpdateTax(UpdateObject):
+class UpdateTax(UpdateCrmObject):
     """Updates Tax using tax_id"""
 
     @property
@@ -546,7 +607,7 @@ class UpdateTax(UpdateObject):
         return 'tax'
 
 
-class UpdateCall(UpdateObject):
+class UpdateCall(UpdateCrmObject):
     """Updates Call using call_id"""
 
     @property
@@ -554,7 +615,7 @@ class UpdateCall(UpdateObject):
         return 'call'
 
 
-class UpdateCommunication(UpdateObject):
+class UpdateCommunication(UpdateCrmObject):
     """Updates Communication using communication_id"""
 
     @property
@@ -562,7 +623,7 @@ class UpdateCommunication(UpdateObject):
         return 'communication'
 
 
-class UpdateEmail(UpdateObject):
+class UpdateEmail(UpdateCrmObject):
     """Updates Email using email_id"""
 
     @property
@@ -570,7 +631,7 @@ class UpdateEmail(UpdateObject):
         return 'email'
 
 
-class UpdateMeeting(UpdateObject):
+class UpdateMeeting(UpdateCrmObject):
     """Updates Meeting using meeting_id"""
 
     @property
@@ -578,7 +639,7 @@ class UpdateMeeting(UpdateObject):
         return 'meeting'
 
 
-class UpdateNote(UpdateObject):
+class UpdateNote(UpdateCrmObject):
     """Updates Note using note_id"""
 
     @property
@@ -586,7 +647,7 @@ class UpdateNote(UpdateObject):
         return 'note'
 
 
-class UpdatePostalMail(UpdateObject):
+class UpdatePostalMail(UpdateCrmObject):
     """Updates PostalMail using postal_mail_id"""
 
     @property
@@ -594,7 +655,7 @@ class UpdatePostalMail(UpdateObject):
         return 'postal_mail'
 
 
-class UpdateTask(UpdateObject):
+class UpdateTask(UpdateCrmObject):
     """Updates Task using task_id"""
 
     @property
@@ -612,7 +673,7 @@ class RemoveObject(HubSpotClient, ABC):
 
     @batched()
     def process_requests(self, data_reader):
-        inputs = [{"id": str(row[f"{self.object_type}_id"])} for row in data_reader]
+        inputs = [{"id": row[f"{self.object_type}_id"]} for row in data_reader]
         self.make_batch_request(inputs)
 
 
@@ -728,64 +789,63 @@ class RemoveTask(RemoveObject):
         return 'task'
 
 
-class AssociationCreate(HubSpotClient):
-    """Creates associations between objects in batches"""
+class AssociationObject(HubSpotClient, ABC):
+    """Parent class to associations - sends associations of the same object types in batches"""
 
-    def process_requests(self, data_reader):
-        inputs = [{k: str(v) for k, v in row.items()} for row in data_reader]
+    @abstractmethod
+    def association_input(self, row: dict) -> dict:
+        """Builds a single input of the batch request from the input row"""
 
-        for line in inputs:
-            endpoint_path = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(
-                from_object_type=line.get("from_object_type"),
-                to_object_type=line.get("to_object_type"))
+    @batched()
+    def process_requests(self, data_reader):
+        inputs_by_object_types = defaultdict(list)
+        for row in data_reader:
+            object_types = (row["from_object_type"], row["to_object_type"])
+            inputs_by_object_types[object_types].append(self.association_input(row))
 
-            self.make_request(url=f'{self.base_url}{endpoint_path}',
-                              request_body={'inputs': [{'from': line['from_id'], 'to': line['to_id']}]},
-                              method=ENDPOINT_MAPPING[self.endpoint]["method"])
+        for (from_object_type, to_object_type), inputs in inputs_by_object_types.items():
+            url = self.url.format(from_object_type=from_object_type, to_object_type=to_object_type)
+            self.make_batch_request(inputs, url=url)
 
 
-class AssociationRemove(HubSpotClient):
+class AssociationCreate(AssociationObject):
     """Creates associations between objects in batches"""
 
-    def process_requests(self, data_reader):
-        inputs = [{k: str(v) for k, v in row.items()} for row in data_reader]
+    def association_input(self, row: dict) -> dict:
+        return {'from': row['from_id'], 'to': row['to_id']}
+
 
-        for line in inputs:
-            endpoint_path = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(
-                from_object_type=line.get("from_object_type"),
-                to_object_type=line.get("to_object_type"))
+class AssociationRemove(AssociationObject):
+    """Removes associations between objects in batches"""
 
-            self.make_request(url=f'{self.base_url}{endpoint_path}',
-                              request_body={'inputs': [{'from': line['from_id'], 'to': [line['to_id']]}]},
-                              method=ENDPOINT_MAPPING[self.endpoint]["method"])
+    def association_input(self, row: dict) -> dict:
+        return {'from': row['from_id'], 'to': [row['to_id']]}
 
 
 class CreateCustomObject(HubSpotClient):
-    """Creates custom objects"""
+    """Creates custom objects in batches"""
 
+    @batched()
     def process_requests(self, data_reader):
+        # the object_type column is validated up front when the table name is not used as the type
+        use_table_as_type = self.config_params.get(KEY_USE_TABLE_AS_TYPE, False)
+        inputs_by_object_type = defaultdict(list)
         for row in data_reader:
-            if self.config_params.get("custom_object_use_table_as_type", False):
-                object_type = self.table_name
-            else:
-                if "object_type" not in row:
-                    raise UserException(f"Object_type column is missing in the input table. {row}")
-                if not row["object_type"]:
-                    raise UserException(f"Cannot process list with empty records in [object_type] column. {row}")
-                object_type = row["object_type"]
-
-            row_endpoint = ENDPOINT_MAPPING[self.endpoint]['endpoint'].format(
-                object_type=object_type
-            )
-            properties = {k: str(v) for k, v in row.items() if k != "object_type"}
-            self.make_request(url=f'{self.base_url}{row_endpoint}',
-                              request_body={"properties": properties},
-                              method=ENDPOINT_MAPPING[self.endpoint]["method"])
-
-
-def test_credentials(token: str) -> bool:
+            object_type = self.table_name if use_table_as_type else row["object_type"]
+            # the row itself becomes the properties, without the column selecting the object type
+            row.pop("object_type", None)
+            inputs_by_object_type[object_type].append({"properties": row})
+
+        for object_type, inputs in inputs_by_object_type.items():
+            self.make_batch_request(inputs, url=self.url.format(object_type=object_type))
+
+
+def test_credentials(token: str, session: Optional[Session] = None) -> bool:
     """
     Uses 'https://api.hubapi.com/contacts/v1/lists/all/contacts/recent' endpoint to check the validity of token.
+    Args:
+        token: Hubspot private app token
+        session: Session to reuse for the check, so its connection can serve the following requests
     Returns:
         True if auth check succeeds
     Raises:
@@ -797,7 +857,7 @@ def test_credentials(token: str) -> bool:
     auth_headers = {'Authorization': f'Bearer {token}'}
 
     try:
-        auth_test = get(auth_url, params=auth_param, headers=auth_headers)
+        auth_test = (session or Session()).get(auth_url, params=auth_param, headers=auth_headers)
         auth_test.raise_for_status()
     except HTTPError as e:
         raise UserException(f"Cannot reach Hubspot API, please check your credentials. "
@@ -809,7 +869,71 @@ def test_credentials(token: str) -> bool:
     return True
 
 
-def get_factory(endpoint: str, config_params: dict, error_writer: csv.DictWriter, table_name: str) -> HubSpotClient:
+ENDPOINT_CLIENTS = {
+    "contact_create": CreateContact,
+    "list_create": CreateContactList,
+    "custom_list_create": CreateCustomList,
+    "custom_object_create": CreateCustomObject,
+    "contact_add_to_list": AddContactToList,
+    "contact_remove_from_list": RemoveContactFromList,
+    "contact_update": UpdateContact,
+    "contact_update_by_email": UpdateContactByEmail,
+    "company_create": CreateCompany,
+    "company_update": UpdateCompany,
+    "company_remove": RemoveCompany,
+    "company_add_to_list": AddCompanyToList,
+    "company_remove_from_list": RemoveCompanyFromList,
+    "deal_create": CreateDeal,
+    "deal_update": UpdateDeal,
+    "deal_remove": RemoveDeal,
+    "deal_add_to_list": AddDealToList,
+    "deal_remove_from_list": RemoveDealFromList,
+    "ticket_create": CreateTicket,
+    "ticket_update": UpdateTicket,
+    "ticket_remove": RemoveTicket,
+    "product_create": CreateProduct,
+    "product_update": UpdateProduct,
+    "product_remove": RemoveProduct,
+    "quote_create": CreateQuote,
+    "quote_update": UpdateQuote,
+    "quote_remove": RemoveQuote,
+    "line_item_create": CreateLineItem,
+    "line_item_update": UpdateLineItem,
+    "line_item_remove": RemoveLineItem,
+    "tax_create": CreateTax,
+    "tax_update": UpdateTax,
+    "tax_remove": RemoveTax,
+    "call_create": CreateCall,
+    "call_update": UpdateCall,
+    "call_remove": RemoveCall,
+    "communication_create": CreateCommunication,
+    "communication_update": UpdateCommunication,
+    "communication_remove": RemoveCommunication,
+    "email_create": CreateEmail,
+    "email_update": UpdateEmail,
+    "email_remove": RemoveEmail,
+    "meeting_create": CreateMeeting,
+    "meeting_update": UpdateMeeting,
+    "meeting_remove": RemoveMeeting,
+    "note_create": CreateNote,
+    "note_update": UpdateNote,
+    "note_remove": RemoveNote,
+    "postal_mail_create": CreatePostalMail,
+    "postal_mail_update": UpdatePostalMail,
+    "postal_mail_remove": RemovePostalMail,
+    "task_create": CreateTask,
+    "task_update": UpdateTask,
+    "task_remove": RemoveTask,
+    "association_create": AssociationCreate,
+    "association_remove": AssociationRemove,
+    "secondary_email_add": AddSecondaryEmail,
+    "secondary_email_update": UpdateSecondaryEmail,
+    "secondary_email_remove": RemoveSecondaryEmail
+}
+
+
+def get_factory(endpoint: str, config_params: dict, error_writer: csv.DictWriter, table_name: str,
+                session: Optional[Session] = None) -> HubSpotClient:
     """Constructs an exporter factory based on endpoint selection
 
     Args:
@@ -817,88 +941,32 @@ def get_factory(endpoint: str, config_params: dict, error_writer: csv.DictWriter
         config_params: Parameters from config.json
         error_writer: csv.DictWriter for request errors
         table_name: name of the input table
+        session: Session shared with the credentials check
     """
-
-    endpoints = {
-        "contact_create": CreateContact,
-        "list_create": CreateContactList,
-        "custom_list_create": CreateCustomList,
-        "custom_object_create": CreateCustomObject,
-        "contact_add_to_list": AddContactToList,
-        "contact_remove_from_list": RemoveContactFromList,
-        "contact_update": UpdateContact,
-        "contact_update_by_email": UpdateContactByEmail,
-        "company_create": CreateCompany,
-        "company_update": UpdateCompany,
-        "company_remove": RemoveCompany,
-        "company_add_to_list": AddCompanyToList,
-        "company_remove_from_list": RemoveCompanyFromList,
-        "deal_create": CreateDeal,
-        "deal_update": UpdateDeal,
-        "deal_remove": RemoveDeal,
-        "deal_add_to_list": AddDealToList,
-        "deal_remove_from_list": RemoveDealFromList,
-        "ticket_create": CreateTicket,
-        "ticket_update": UpdateTicket,
-        "ticket_remove": RemoveTicket,
-        "product_create": CreateProduct,
-        "product_update": UpdateProduct,
-        "product_remove": RemoveProduct,
-        "quote_create": CreateQuote,
-        "quote_update": UpdateQuote,
-        "quote_remove": RemoveQuote,
-        "line_item_create": CreateLineItem,
-        "line_item_update": UpdateLineItem,
-        "line_item_remove": RemoveLineItem,
-        "tax_create": CreateTax,
-        "tax_update": UpdateTax,
-        "tax_remove": RemoveTax,
-        "call_create": CreateCall,
-        "call_update": UpdateCall,
-        "call_remove": RemoveCall,
-        "communication_create": CreateCommunication,
-        "communication_update": UpdateCommunication,
-        "communication_remove": RemoveCommunication,
-        "email_create": CreateEmail,
-        "email_update": UpdateEmail,
-        "email_remove": RemoveEmail,
-        "meeting_create": CreateMeeting,
-        "meeting_update": UpdateMeeting,
-        "meeting_remove": RemoveMeeting,
-        "note_create": CreateNote,
-        "note_update": UpdateNote,
-        "note_remove": RemoveNote,
-        "postal_mail_create": CreatePostalMail,
-        "postal_mail_update": UpdatePostalMail,
-        "postal_mail_remove": RemovePostalMail,
-        "task_create": CreateTask,
-        "task_update": UpdateTask,
-        "task_remove": RemoveTask,
-        "association_create": AssociationCreate,
-        "association_remove": AssociationRemove,
-        "secondary_email_add": AddSecondaryEmail,
-        "secondary_email_update": UpdateSecondaryEmail,
-        "secondary_email_remove": RemoveSecondaryEmail
-    }
-
-    if endpoint in endpoints:
-        return endpoints[endpoint](endpoint, config_params, error_writer, table_name)
+    if endpoint in ENDPOINT_CLIENTS:
+        return ENDPOINT_CLIENTS[endpoint](endpoint, config_params, error_writer, table_name, session)
     raise UserException(f"Unknown endpoint option: {endpoint}.")
 
 
-def run(endpoint: str, data_reader: csv.DictReader, error_writer: csv.DictWriter, config_params: dict,
-        input_table_name) -> None:
+def run(endpoint: str, data_reader: Iterable[dict], error_writer: csv.DictWriter, config_params: dict,
+        input_table_name, session: Optional[Session] = None) -> None:
     """
     Main entrypoint to call.
     Args:
         config_params: Config parameters
         endpoint: Hubspot API endpoint
-        data_reader: csv.DictReader object with data from input csv
+        data_reader: rows of the input csv as dicts
         error_writer: csv.DictWriter object to log 207 status_code events
         input_table_name: name of the input table
+        session: Session shared with the credentials check
 
     Returns:
         None
     """
-    factory = get_factory(endpoint, config_params, error_writer, input_table_name)
-    factory.process_requests(data_reader=data_reader)
+    factory = get_factory(endpoint, config_params, error_writer, input_table_name, session)
+    try:
+        factory.process_requests(data_reader=data_reader)
+        factory.wait_for_requests()
+        factory.log_summary()
+    finally:
+        factory.close()
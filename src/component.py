@@ -3,6 +3,9 @@ Hubspot Writer
 """
 import csv
 import logging
+import os
+from functools import cached_property
+from typing import Iterator, List, TextIO
 
 from keboola.component import dao
 from keboola.component.base import ComponentBase
@@ -14,6 +17,9 @@ from exceptions import UserException
 # configuration variables
 KEY_OBJECT = 'hubspot_object'
 
+# read buffer for the input table, large enough to keep read() syscalls rare on multi-GB inputs
+INPUT_BUFFER_SIZE = 1 << 20
+
 # list of mandatory parameters => if some is missing,
 # component will fail with readable message on initialization.
 REQUIRED_PARAMETERS = [
@@ -22,12 +28,37 @@ REQUIRED_PARAMETERS = [
 HUBSPOT_OBJECTS = ("contact", "company", "list", "deal", "ticket", "product", "quote", "line_item", "tax", "call",
                    "communication", "email", "meeting", "note", "postal_mail", "task", "custom_list", "association",
                    "secondary_email", "custom_object")
+ACTION_KEYS = tuple(f"{hubspot_object}_action" for hubspot_object in HUBSPOT_OBJECTS)
 
 
 def coalesce(*arg):
     return next((a for a in arg if a is not None), None)
 
 
+def open_input_table(table: dao.TableDefinition) -> TextIO:
+    """Opens the input table for a sequential read, hinting the kernel to use a larger readahead where supported"""
+    input_file = open(table.full_path, newline='', buffering=INPUT_BUFFER_SIZE)
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(input_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return input_file
+
+
+def read_rows(reader: Iterator[List[str]], header: List[str], table_name: str) -> Iterator[dict]:
+    """
+    Reads the rows of a csv.reader as dicts keyed by the header, skipping blank lines.
+    Building each dict with a single dict(zip()) call avoids the per-row bookkeeping of csv.DictReader.
+    Rows with a different number of values than the header are rejected,
+    as padding or truncating them would send missing or shifted properties.
+    """
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != len(header):
+            raise UserException(f"Cannot process input table {table_name}, line {reader.line_num} has "
+                                f"{len(row)} values while the header has {len(header)} columns.")
+        yield dict(zip(header, row))
+
+
 class Component(ComponentBase):
     def __init__(self):
         super().__init__()
@@ -51,41 +82,45 @@ class Component(ComponentBase):
 
         input_table = in_tables[0]
 
-        # Input checks
+        # Input checks, local ones first so a misconfigured job fails before any request is made
         self.validate_configuration_parameters(REQUIRED_PARAMETERS)
-        hubspot_client.test_credentials(self.params["#private_app_token"])
         self.validate_user_input(input_table)
+        session = hubspot_client.create_session()
+        hubspot_client.test_credentials(self.params["#private_app_token"], session)
 
         output_table = self.create_out_table_definition('errors.csv', write_always=True)
 
         logging.info(f"Processing input table: {input_table.name}")
 
-        with open(input_table.full_path) as input_file, open(output_table.full_path, 'w', newline='') as output_file:
-            reader = csv.DictReader(input_file)
+        with open_input_table(input_table) as input_file, \
+                open(output_table.full_path, 'w', newline='') as output_file:
+            reader = csv.reader(input_file)
+            header = next(reader, [])
+            rows = read_rows(reader, header, input_table.name)
             error_writer = csv.DictWriter(output_file, fieldnames=hubspot_client.ERRORS_TABLE_COLUMNS)
             error_writer.writeheader()
             error_writer.errors = False
-            hubspot_client.run(self.endpoint, reader, error_writer, self.params, input_table.name)
+            hubspot_client.run(self.endpoint, rows, error_writer, self.params, input_table.name, session)
 
             if error_writer.errors:
                 self.write_manifest(output_table)
                 raise UserException(
                     'There were errors during some requests handling - check errors.csv for more details.')
 
-    @property
+    @cached_property
     def hubspot_object(self) -> str:
         return self.params.get(KEY_OBJECT)
 
-    @property
+    @cached_property
     def endpoint(self) -> str:
         if self.hubspot_object in LEGACY_ENDPOINT_MAPPING_CONVERSION:
             return LEGACY_ENDPOINT_MAPPING_CONVERSION[self.hubspot_object]
         else:
             return f"{self.hubspot_object}_{self.action}"
 
-    @property
+    @cached_property
     def action(self) -> str:
-        action = coalesce(*(self.params.get(f"{hubspot_object}_action") for hubspot_object in HUBSPOT_OBJECTS))
+        action = coalesce(*(self.params.get(action_key) for action_key in ACTION_KEYS))
 
         if action is None and self.hubspot_object not in list(LEGACY_ENDPOINT_MAPPING_CONVERSION.keys()):
             raise UserException("A valid Object action must be provided.")
@@ -98,13 +133,36 @@ class Component(ComponentBase):
             raise UserException(f"{self.endpoint} is not a valid endpoint.")
 
         # 2 - Ensure all required columns are in the input files for the respective endpoint.
-        # Comparing this information with the file's manifest
-        required_columns = ENDPOINT_MAPPING[self.endpoint]["required_column"]
-        table_columns = table.column_names
-        missing_columns = [column for column in required_columns if column not in table_columns]
-
-        if missing_columns:
-            raise UserException(f"Missing columns {missing_columns} in input table {table.name}")
+        # Comparing this information with the header of the file, which the rows are keyed by
+        endpoint_spec = ENDPOINT_MAPPING[self.endpoint]
+        required_columns = endpoint_spec["required_column"]
+        not_empty_columns = endpoint_spec["not_empty_column"]
+        allowed_values = endpoint_spec["allowed_values"]
+        columns_optional_parameter = endpoint_spec["columns_optional_parameter"]
+        if columns_optional_parameter and self.params.get(columns_optional_parameter):
+            required_columns = not_empty_columns = ()
+
+        with open_input_table(table) as input_file:
+            reader = csv.reader(input_file)
+            header = next(reader, [])
+            table_columns = set(header)
+            missing_columns = [column for column in required_columns if column not in table_columns]
+
+            if missing_columns:
+                raise UserException(f"Missing columns {missing_columns} in input table {table.name}")
+
+            # 3 - Ensure every row matches the header and has its key columns filled, before any request is sent.
+            # A single scan of the table is cheap compared to leaving the import half-done.
+            # The rows are read the same way as during processing.
+            for row in read_rows(reader, header, table.name):
+                for column in not_empty_columns:
+                    if not row[column]:
+                        raise UserException(f"Cannot process input table {table.name} with empty records "
+                                            f"in [{column}] column on line {reader.line_num}. {row}")
+                for column, values in allowed_values.items():
+                    if row[column] not in values:
+                        raise UserException(f"Invalid {column} {row[column]} on line {reader.line_num} "
+                                            f"of input table {table.name}, supported values are {list(values)}.")
 
 
 """
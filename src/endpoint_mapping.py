@@ -1,302 +1,222 @@
-ENDPOINT_MAPPING = {
+from types import MappingProxyType
+
+__all__ = ('ENDPOINT_MAPPING', 'KEY_USE_TABLE_AS_TYPE', 'LEGACY_ENDPOINT_MAPPING_CONVERSION', 'OBJECT_TYPE_IDS')
+
+BATCH_SIZE = 100  # v3/v4 batch endpoints accept up to 100 inputs per request
+
+# configuration parameter making the custom object writer use the table name as the object type
+KEY_USE_TABLE_AS_TYPE = 'custom_object_use_table_as_type'
+
+# object types supported by custom lists and their HubSpot ids
+OBJECT_TYPE_IDS = {
+    'contact': '0-1',
+    'company': '0-2',
+    'deal': '0-3'
+}
+
+# columns describing the association of a newly created object with an existing one
+ASSOCIATION_COLUMNS = ('association_id', 'association_category', 'association_type_id')
+
+# CRM objects created with an association and updated/removed by their id, as (object type, path in the API)
+CRM_OBJECTS = (('ticket', 'tickets'), ('product', 'products'), ('quote', 'quotes'), ('line_item', 'line_items'),
+               ('tax', 'taxes'), ('call', 'calls'), ('communication', 'communications'), ('email', 'emails'),
+               ('meeting', 'meetings'), ('note', 'notes'), ('postal_mail', 'postal_mail'), ('task', 'tasks'))
+
+# CRM objects requiring more columns than the association ones on create
+CRM_OBJECT_CREATE_COLUMNS = {
+    'line_item': ('name', 'price', 'quantity', *ASSOCIATION_COLUMNS)
+}
+
+
+def _crm_object_endpoints() -> dict:
+    """Builds the create, update and remove endpoints of the CRM_OBJECTS, all using the v3 batch API"""
+    endpoints = {}
+    for object_type, object_path in CRM_OBJECTS:
+        batch_endpoint = f'crm/v3/objects/{object_path}/batch'
+        id_column = f'{object_type}_id'
+        endpoints[f'{object_type}_create'] = {
+            'endpoint': f'{batch_endpoint}/create',
+            'required_column': CRM_OBJECT_CREATE_COLUMNS.get(object_type, ASSOCIATION_COLUMNS),
+            'not_empty_column': ['association_id'],
+            'method': 'post'
+        }
+        endpoints[f'{object_type}_update'] = {
+            'endpoint': f'{batch_endpoint}/update',
+            'required_column': [id_column],
+            'not_empty_column': [id_column],
+            'method': 'post'
+        }
+        endpoints[f'{object_type}_remove'] = {
+            'endpoint': f'{batch_endpoint}/archive',
+            'required_column': [id_column],
+            'not_empty_column': [],
+            'method': 'post'
+        }
+    return endpoints
+
+
+_ENDPOINT_MAPPING = {
     'contact_create': {
         'endpoint': 'crm/v3/objects/contacts/batch/create',
         'required_column': [],
+        'not_empty_column': [],
         'method': 'post'
     },
     'list_create': {
         'endpoint': 'contacts/v1/lists',
         'required_column': ['name'],
+        'not_empty_column': [],
         'method': 'post'
     },
     'custom_list_create': {
         'endpoint': 'crm/v3/lists',
         'required_column': ['name', 'object_type'],
+        'not_empty_column': ['name', 'object_type'],
+        'allowed_values': {'object_type': tuple(OBJECT_TYPE_IDS)},
         'method': 'post'
     },
     'custom_object_create': {
-        'endpoint': 'crm/v3/objects/{object_type}',
-        'required_column': [],
+        'endpoint': 'crm/v3/objects/{object_type}/batch/create',
+        'required_column': ['object_type'],
+        'not_empty_column': ['object_type'],
+        # the object_type column is not needed when the table name is used as the object type
+        'columns_optional_parameter': KEY_USE_TABLE_AS_TYPE,
         'method': 'post'
     },
     'contact_add_to_list': {
         'endpoint': 'contacts/v1/lists/{list_id}/add',
         'required_column': ['list_id', 'vids', 'emails'],
+        'not_empty_column': ['list_id'],
         'method': 'post'
     },
     'contact_remove_from_list': {
         'endpoint': 'contacts/v1/lists/{list_id}/remove',
         'required_column': ['list_id', 'vids'],
+        'not_empty_column': ['list_id', 'vids'],
         'method': 'post'
     },
     'company_add_to_list': {
         'endpoint': 'crm/v3/lists/{list_id}/memberships/add-and-remove',
         'required_column': ['list_id', 'vids'],
+        'not_empty_column': ['list_id', 'vids'],
         'method': 'put'
     },
     'company_remove_from_list': {
         'endpoint': 'crm/v3/lists/{list_id}/memberships/add-and-remove',
         'required_column': ['list_id', 'vids'],
+        'not_empty_column': ['list_id', 'vids'],
         'method': 'put'
     },
     'contact_update': {
         'endpoint': 'crm/v3/objects/contacts/batch/update',
         'required_column': ['vid'],
+        'not_empty_column': ['vid'],
         'method': 'post'
     },
     'contact_update_by_email': {
-        'endpoint': 'contacts/v1/contact/email/{email}/profile',
+        'endpoint': 'crm/v3/objects/contacts/batch/update',
         'required_column': ['email'],
+        'not_empty_column': ['email'],
         'method': 'post'
     },
     'company_create': {
         'endpoint': 'crm/v3/objects/companies/batch/create',
         'required_column': ['name'],
+        'not_empty_column': ['name'],
         'method': 'post'
     },
     'company_update': {
         'endpoint': 'crm/v3/objects/companies/batch/update',
         'required_column': ['company_id'],
+        'not_empty_column': ['company_id'],
         'method': 'post'
     },
     'company_remove': {
         'endpoint': 'crm/v3/objects/companies/batch/archive',
         'required_column': ['company_id'],
+        'not_empty_column': [],
         'method': 'post'
     },
     'deal_create': {
         'endpoint': 'crm/v3/objects/deals/batch/create',
         'required_column': ['hubspot_owner_id'],
+        'not_empty_column': ['hubspot_owner_id'],
         'method': 'post'
     },
     'deal_update': {
         'endpoint': 'crm/v3/objects/deals/batch/update',
         'required_column': ['deal_id'],
+        'not_empty_column': ['deal_id'],
         'method': 'post'
     },
     'deal_remove': {
         'endpoint': 'crm/v3/objects/deals/batch/archive',
         'required_column': ['deal_id'],
+        'not_empty_column': [],
         'method': 'post'
     },
     'deal_add_to_list': {
         'endpoint': 'crm/v3/lists/{list_id}/memberships/add-and-remove',
         'required_column': ['list_id', 'vids'],
+        'not_empty_column': ['list_id', 'vids'],
         'method': 'put'
     },
     'deal_remove_from_list': {
         'endpoint': 'crm/v3/lists/{list_id}/memberships/add-and-remove',
         'required_column': ['list_id', 'vids'],
+        'not_empty_column': ['list_id', 'vids'],
         'method': 'put'
     },
-    'ticket_create': {
-        'endpoint': 'crm/v3/objects/tickets/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'ticket_update': {
-        'endpoint': 'crm/v3/objects/tickets/batch/update',
-        'required_column': ['ticket_id'],
-        'method': 'post'
-    },
-    'ticket_remove': {
-        'endpoint': 'crm/v3/objects/tickets/batch/archive',
-        'required_column': ['ticket_id'],
-        'method': 'post'
-    },
-    'product_create': {
-        'endpoint': 'crm/v3/objects/products/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'product_update': {
-        'endpoint': 'crm/v3/objects/products/batch/update',
-        'required_column': ['product_id'],
-        'method': 'post'
-    },
-    'product_remove': {
-        'endpoint': 'crm/v3/objects/products/batch/archive',
-        'required_column': ['product_id'],
-        'method': 'post'
-    },
-    'quote_create': {
-        'endpoint': 'crm/v3/objects/quotes/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'quote_update': {
-        'endpoint': 'crm/v3/objects/quotes/batch/update',
-        'required_column': ['quote_id'],
-        'method': 'post'
-    },
-    'quote_remove': {
-        'endpoint': 'crm/v3/objects/quotes/batch/archive',
-        'required_column': ['quote_id'],
-        'method': 'post'
-    },
-    'line_item_create': {
-        'endpoint': 'crm/v3/objects/line_items/batch/create',
-        'required_column': ['name', 'price', 'quantity', 'association_id', 'association_category',
-                            'association_type_id'],
-        'method': 'post'
-    },
-    'line_item_update': {
-        'endpoint': 'crm/v3/objects/line_items/batch/update',
-        'required_column': ['line_item_id'],
-        'method': 'post'
-    },
-    'line_item_remove': {
-        'endpoint': 'crm/v3/objects/line_items/batch/archive',
-        'required_column': ['line_item_id'],
-        'method': 'post'
-    },
-    'tax_create': {
-        'endpoint': 'crm/v3/objects/taxes/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'tax_update': {
-        'endpoint': 'crm/v3/objects/taxes/batch/update',
-        'required_column': ['tax_id'],
-        'method': 'post'
-    },
-    'tax_remove': {
-        'endpoint': 'crm/v3/objects/taxes/batch/archive',
-        'required_column': ['tax_id'],
-        'method': 'post'
-    },
-    'call_create': {
-        'endpoint': 'crm/v3/objects/calls/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'call_update': {
-        'endpoint': 'crm/v3/objects/calls/batch/update',
-        'required_column': ['call_id'],
-        'method': 'post'
-    },
-    'call_remove': {
-        'endpoint': 'crm/v3/objects/calls/batch/archive',
-        'required_column': ['call_id'],
-        'method': 'post'
-    },
-    'communication_create': {
-        'endpoint': 'crm/v3/objects/communications/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'communication_update': {
-        'endpoint': 'crm/v3/objects/communications/batch/update',
-        'required_column': ['communication_id'],
-        'method': 'post'
-    },
-    'communication_remove': {
-        'endpoint': 'crm/v3/objects/communications/batch/archive',
-        'required_column': ['communication_id'],
-        'method': 'post'
-    },
-    'email_create': {
-        'endpoint': 'crm/v3/objects/emails/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'email_update': {
-        'endpoint': 'crm/v3/objects/emails/batch/update',
-        'required_column': ['email_id'],
-        'method': 'post'
-    },
-    'email_remove': {
-        'endpoint': 'crm/v3/objects/emails/batch/archive',
-        'required_column': ['email_id'],
-        'method': 'post'
-    },
-    'meeting_create': {
-        'endpoint': 'crm/v3/objects/meetings/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'meeting_update': {
-        'endpoint': 'crm/v3/objects/meetings/batch/update',
-        'required_column': ['meeting_id'],
-        'method': 'post'
-    },
-    'meeting_remove': {
-        'endpoint': 'crm/v3/objects/meetings/batch/archive',
-        'required_column': ['meeting_id'],
-        'method': 'post'
-    },
-    'note_create': {
-        'endpoint': 'crm/v3/objects/notes/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'note_update': {
-        'endpoint': 'crm/v3/objects/notes/batch/update',
-        'required_column': ['note_id'],
-        'method': 'post'
-    },
-    'note_remove': {
-        'endpoint': 'crm/v3/objects/notes/batch/archive',
-        'required_column': ['note_id'],
-        'method': 'post'
-    },
-    'postal_mail_create': {
-        'endpoint': 'crm/v3/objects/postal_mail/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'postal_mail_update': {
-        'endpoint': 'crm/v3/objects/postal_mail/batch/update',
-        'required_column': ['postal_mail_id'],
-        'method': 'post'
-    },
-    'postal_mail_remove': {
-        'endpoint': 'crm/v3/objects/postal_mail/batch/archive',
-        'required_column': ['postal_mail_id'],
-        'method': 'post'
-    },
-    'task_create': {
-        'endpoint': 'crm/v3/objects/tasks/batch/create',
-        'required_column': ['association_id', 'association_category', 'association_type_id'],
-        'method': 'post'
-    },
-    'task_update': {
-        'endpoint': 'crm/v3/objects/tasks/batch/update',
-        'required_column': ['task_id'],
-        'method': 'post'
-    },
-    'task_remove': {
-        'endpoint': 'crm/v3/objects/tasks/batch/archive',
-        'required_column': ['task_id'],
-        'method': 'post'
-    },
+    **_crm_object_endpoints(),
     'association_create': {
         'endpoint': 'crm/v4/associations/{from_object_type}/{to_object_type}/batch/associate/default',
         'required_column': ['from_id', 'to_id', 'from_object_type', 'to_object_type'],
+        'not_empty_column': [],
         'method': 'post'
     },
     'association_remove': {
         'endpoint': 'crm/v4/associations/{from_object_type}/{to_object_type}/batch/archive',
         'required_column': ['from_id', 'to_id', 'from_object_type', 'to_object_type'],
+        'not_empty_column': [],
         'method': 'post'
     },
     'secondary_email_add': {
         'endpoint': 'contacts/v1/secondary-email/',
         'required_column': ['vid', 'secondary_email'],
+        'not_empty_column': [],
         'method': 'put'
     },
     'secondary_email_update': {
         'endpoint': 'contacts/v1/secondary-email/',
         'required_column': ['vid', 'secondary_email_old', 'secondary_email'],
+        'not_empty_column': [],
         'method': 'patch'
     },
     'secondary_email_remove': {
         'endpoint': 'contacts/v1/secondary-email/',
         'required_column': ['vid', 'secondary_email'],
+        'not_empty_column': [],
         'method': 'delete'
     }
 }
 
+
+def _freeze(mapping: dict) -> MappingProxyType:
+    """
+    Returns a read-only view of an endpoint definition, with its column lists turned into tuples,
+    defaults for the optional validation keys and the number of inputs sent per request,
+    1 for endpoints taking a single object.
+    """
+    frozen = {key: tuple(value) if isinstance(value, list) else value for key, value in mapping.items()}
+    frozen['allowed_values'] = MappingProxyType(mapping.get('allowed_values', {}))
+    frozen.setdefault('columns_optional_parameter', None)
+    frozen['batch_size'] = BATCH_SIZE if '/batch/' in mapping['endpoint'] else 1
+    return MappingProxyType(frozen)
+
+
+# read-only views, the mapping is shared by the component and all client threads
+ENDPOINT_MAPPING = MappingProxyType({endpoint: _freeze(mapping) for endpoint, mapping in _ENDPOINT_MAPPING.items()})
+
 # for backward compatibility
 LEGACY_ENDPOINT_MAPPING_CONVERSION = {'create_contact': 'contact_create',
                                       'create_list': 'list_create',
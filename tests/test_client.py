@@ -0,0 +1,172 @@
+import csv
+import io
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import mock
+import orjson
+
+import client
+
+
+def make_session(status_code=200, body=None):
+    session = mock.Mock()
+    response = mock.Mock(status_code=status_code, text='', headers={})
+    response.content = orjson.dumps(body or {})
+    session.request.return_value = response
+    return session
+
+
+def make_error_writer(output=None):
+    error_writer = csv.DictWriter(output or io.StringIO(), fieldnames=client.ERRORS_TABLE_COLUMNS)
+    error_writer.errors = False
+    return error_writer
+
+
+def sent_bodies(session):
+    return [orjson.loads(c.kwargs['data']) for c in session.request.call_args_list]
+
+
+class RateLimitedServer:
+    """Local server answering every request with 429 Too Many Requests"""
+
+    def __init__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                server.requests += 1
+                body = orjson.dumps({'status': 'error', 'category': 'RATE_LIMITS', 'message': 'Too many requests'})
+                self.send_response(429)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = 0
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@mock.patch('client.time.sleep', mock.Mock())
+class TestClient(unittest.TestCase):
+
+    def run_endpoint(self, endpoint, rows, session=None, config_params=None):
+        session = session or make_session()
+        client.run(endpoint, iter(rows), make_error_writer(), config_params or {}, 'table', session)
+        return session
+
+    def test_create_contact_sends_rows_in_batches(self):
+        rows = [{'email': f'{i}@example.com', 'firstname': 'John'} for i in range(150)]
+        session = self.run_endpoint('contact_create', rows)
+
+        bodies = sent_bodies(session)
+        self.assertEqual([len(body['inputs']) for body in bodies], [100, 50])
+        self.assertEqual(bodies[0]['inputs'][0], {'properties': {'email': '0@example.com', 'firstname': 'John'}})
+
+    def test_parallel_requests_send_all_batches(self):
+        rows = [{'email': f'{i}@example.com'} for i in range(1050)]
+        session = self.run_endpoint('contact_create', rows, config_params={'max_workers': 4})
+
+        self.assertEqual(sorted(len(body['inputs']) for body in sent_bodies(session)), [50] + [100] * 10)
+
+    def test_update_contact_uses_vid_as_id(self):
+        session = self.run_endpoint('contact_update', [{'vid': '1', 'firstname': 'John'}])
+
+        self.assertEqual(sent_bodies(session), [{'inputs': [{'id': '1', 'properties': {'firstname': 'John'}}]}])
+
+    def test_update_contact_by_email_uses_email_as_id_property(self):
+        session = self.run_endpoint('contact_update_by_email', [{'email': 'john@example.com', 'firstname': 'John'}])
+
+        self.assertEqual(sent_bodies(session), [{'inputs': [
+            {'id': 'john@example.com', 'idProperty': 'email', 'properties': {'firstname': 'John'}}]}])
+
+    def test_associations_are_batched_by_object_types(self):
+        rows = [{'from_id': str(i), 'to_id': '10', 'from_object_type': 'contact', 'to_object_type': to_type}
+                for i, to_type in enumerate(['company', 'deal', 'company'])]
+        session = self.run_endpoint('association_create', rows)
+
+        requests = [(c.args[1], orjson.loads(c.kwargs['data'])) for c in session.request.call_args_list]
+        self.assertEqual(requests, [
+            ('https://api.hubapi.com/crm/v4/associations/contact/company/batch/associate/default',
+             {'inputs': [{'from': '0', 'to': '10'}, {'from': '2', 'to': '10'}]}),
+            ('https://api.hubapi.com/crm/v4/associations/contact/deal/batch/associate/default',
+             {'inputs': [{'from': '1', 'to': '10'}]})])
+
+    def test_add_contacts_to_list_is_split_by_request_limit(self):
+        rows = [{'list_id': '1', 'vids': str(i), 'emails': ''} for i in range(400)]
+        rows += [{'list_id': '1', 'vids': '', 'emails': f'{i}@example.com'} for i in range(200)]
+        session = self.run_endpoint('contact_add_to_list', rows)
+
+        bodies = sent_bodies(session)
+        self.assertEqual([(len(body['vids']), len(body['emails'])) for body in bodies], [(400, 100), (0, 100)])
+        self.assertEqual(bodies[1]['emails'][0], '100@example.com')
+
+    def test_custom_objects_use_table_name_as_type(self):
+        rows = [{'object_type': 'ignored', 'name': 'Car'}]
+        session = self.run_endpoint('custom_object_create', rows,
+                                    config_params={'custom_object_use_table_as_type': True})
+
+        session.request.assert_called_once()
+        self.assertEqual(session.request.call_args.args[1],
+                         'https://api.hubapi.com/crm/v3/objects/table/batch/create')
+        self.assertEqual(sent_bodies(session), [{'inputs': [{'properties': {'name': 'Car'}}]}])
+
+    def test_failed_requests_are_counted_and_logged_into_errors_table(self):
+        session = make_session(status_code=207, body={'errors': [
+            {'status': 'error', 'category': 'VALIDATION_ERROR', 'subCategory': 'INVALID_EMAIL',
+             'message': 'Invalid email', 'context': {}}]})
+        output = io.StringIO()
+        error_writer = make_error_writer(output)
+        factory = client.get_factory('contact_create', {}, error_writer, 'table', session)
+
+        factory.process_requests([{'email': 'invalid'}])
+
+        self.assertEqual((factory.requests_sent, factory.requests_failed), (1, 1))
+        self.assertTrue(error_writer.errors)
+        self.assertEqual(output.getvalue(), 'error,VALIDATION_ERROR,Invalid email,{}\r\n')
+
+    @mock.patch('urllib3.util.retry.time.sleep', mock.Mock())
+    def test_response_is_logged_when_retries_run_out(self):
+        with RateLimitedServer() as server:
+            session = client.create_session()
+            # the local server speaks plain http, use the retry policy of the HubSpot session for it
+            session.mount('http://', session.get_adapter('https://api.hubapi.com/'))
+            output = io.StringIO()
+            error_writer = make_error_writer(output)
+            factory = client.get_factory('contact_create', {}, error_writer, 'table', session)
+            factory.url = server.url
+
+            factory.process_requests([{'email': 'john@example.com'}])
+
+        self.assertEqual(server.requests, 9)  # the first attempt and 8 retries
+        self.assertEqual((factory.requests_sent, factory.requests_failed), (1, 1))
+        self.assertEqual(output.getvalue(), 'error,RATE_LIMITS,Too many requests,\r\n')
+
+    def test_rate_limiter_slows_down_when_few_requests_remain(self):
+        rate_limiter = client.RateLimiter(interval=0.1)
+
+        rate_limiter.update({client.RATE_LIMIT_REMAINING_HEADER: '5', client.RATE_LIMIT_INTERVAL_HEADER: '10000'})
+        self.assertEqual(rate_limiter.interval, 2)
+
+        rate_limiter.update({client.RATE_LIMIT_REMAINING_HEADER: '190', client.RATE_LIMIT_INTERVAL_HEADER: '10000'})
+        self.assertEqual(rate_limiter.interval, 0.1)
+
+        rate_limiter.update({})
+        self.assertEqual(rate_limiter.interval, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
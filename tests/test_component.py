@@ -6,9 +6,11 @@ Created on 12. 11. 2018
 import unittest
 import mock
 import os
+import tempfile
 from freezegun import freeze_time
 
 from component import Component
+from exceptions import UserException
 
 
 class TestComponent(unittest.TestCase):
@@ -22,6 +24,48 @@ class TestComponent(unittest.TestCase):
             comp = Component()
             comp.run()
 
+    @staticmethod
+    def _make_component(params):
+        comp = Component.__new__(Component)
+        comp.params = params
+        return comp
+
+    def _make_table(self, contents, name):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as input_file:
+            input_file.write(contents)
+        self.addCleanup(os.remove, input_file.name)
+        table = mock.Mock(full_path=input_file.name)
+        table.name = name
+        return table
+
+    def test_validate_user_input_fails_on_empty_key_column(self):
+        comp = self._make_component({'hubspot_object': 'contact', 'contact_action': 'update'})
+        table = self._make_table('vid,firstname\n1,John\n,Jane\n', 'contacts.csv')
+
+        with self.assertRaisesRegex(UserException, r'\[vid\] column on line 3'):
+            comp.validate_user_input(table)
+
+    def test_validate_user_input_checks_columns_in_file_header(self):
+        comp = self._make_component({'hubspot_object': 'contact', 'contact_action': 'update'})
+        table = self._make_table('firstname\nJohn\n', 'contacts.csv')
+
+        with self.assertRaisesRegex(UserException, r"Missing columns \['vid'\]"):
+            comp.validate_user_input(table)
+
+    def test_validate_user_input_fails_on_unsupported_custom_list_object_type(self):
+        comp = self._make_component({'hubspot_object': 'custom_list', 'custom_list_action': 'create'})
+        table = self._make_table('name,object_type\nLeads,contact\nTickets,ticket\n', 'lists.csv')
+
+        with self.assertRaisesRegex(UserException, r'Invalid object_type ticket on line 3'):
+            comp.validate_user_input(table)
+
+    def test_validate_user_input_fails_on_row_not_matching_header(self):
+        comp = self._make_component({'hubspot_object': 'contact', 'contact_action': 'create'})
+        table = self._make_table('email,firstname\njohn@example.com,John\njane@example.com\n', 'contacts.csv')
+
+        with self.assertRaisesRegex(UserException, r'line 3 has 1 values while the header has 2 columns'):
+            comp.validate_user_input(table)
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']